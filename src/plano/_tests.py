@@ -64,6 +64,20 @@ def archive_operations():
         assert is_dir("something-else"), list_dir()
         assert is_file("something-else/some-file"), list_dir("something-else")
 
+        if not WINDOWS:
+            # A stand-in pigz that records its use and defers to gzip
+            bin_dir = make_dir("bin")
+            pigz = write(join(bin_dir, "pigz"), "#!/bin/sh\ntouch \"$0.used\"\nexec gzip \"$@\"\n")
+            _os.chmod(pigz, 0o755)
+
+            with working_env(PATH=f"{get_absolute_path(bin_dir)}:{ENV['PATH']}"):
+                make_archive("some-dir", output_file="pigz-dir.tar.gz")
+
+            assert exists(join(bin_dir, "pigz.used")), list_dir(bin_dir)
+
+            extract_archive("pigz-dir.tar.gz", output_dir="pigz-subdir")
+            assert is_file("pigz-subdir/some-dir/some-file"), list_dir("pigz-subdir")
+
 @test
 def command_operations():
     class SomeCommand(BaseCommand):
@@ -136,6 +150,9 @@ def dir_operations():
         result = list_dir(test_dir, exclude="*-file-1")
         assert result == ["some-file-2"], (result, ["some-file-2"])
 
+        result = list_dir(test_dir, include=["*-1", "*-2"], exclude=["*-2"])
+        assert result == ["some-file-1"], (result, ["some-file-1"])
+
         result = list_dir("some-dir", "*.not-there")
         assert result == [], result
 
@@ -156,6 +173,12 @@ def dir_operations():
         result = find(test_dir, exclude="*-file-1")
         assert result == [test_file_2], (result, [test_file_2])
 
+        result = find(test_dir, include=["*-file-1", "*-file-2"], exclude=["*-2", "*.not-there"])
+        assert result == [test_file_1], (result, [test_file_1])
+
+        result = find([test_dir, test_dir])
+        assert result == [test_file_1, test_file_2], (result, [test_file_1, test_file_2])
+
         with working_dir():
             result = find()
             assert result == [], result
@@ -209,9 +232,27 @@ def env_operations():
     result = get_program_name("X=Y alpha beta")
     assert result == "alpha", result
 
+    prev_args = ARGS[:]
+
+    try:
+        ARGS[:] = ["X=Y", "gamma", "delta"]
+
+        result = get_program_name()
+        assert result == "gamma", result
+    finally:
+        ARGS[:] = prev_args
+
+    result = get_program_name()
+    assert result != "gamma", result
+
     result = which("echo")
     assert result, result
 
+    assert which("echo") == result, result
+
+    with working_env(PATH=""):
+        assert which("echo") is None
+
     with working_env(YES_I_AM_SET=1):
         check_env("YES_I_AM_SET")
 
@@ -272,6 +313,10 @@ def file_operations():
         assert copied_dir == join(beta_dir, "alpha-dir"), copied_dir
         assert is_link(join(copied_dir, "alpha-file-link"))
 
+        copied_dir = copy(alpha_dir, beta_dir)
+        assert copied_dir == join(beta_dir, "alpha-dir"), copied_dir
+        assert is_link(join(copied_dir, "alpha-file-link"))
+
         moved_file = move(beta_file, alpha_dir)
         assert moved_file == join(alpha_dir, "beta-file"), moved_file
         assert is_file(moved_file), list_dir(alpha_dir)
@@ -291,6 +336,16 @@ def file_operations():
         copy(gamma_dir, delta_dir, inside=False)
         assert is_file(join("delta-dir", "gamma-file"))
 
+        make_dir(join(gamma_dir, "empty-dir"))
+        copied_dir = copy(gamma_dir, delta_dir)
+        assert is_dir(join(copied_dir, "empty-dir")), list_dir(copied_dir)
+
+        copied_dir = copy(gamma_dir, gamma_dir)
+        assert copied_dir == join(gamma_dir, "gamma-dir"), copied_dir
+        assert is_file(join(copied_dir, "gamma-file")), list_dir(copied_dir)
+        assert not exists(join(copied_dir, "gamma-dir")), list_dir(copied_dir)
+        remove(copied_dir)
+
         move(gamma_dir, delta_dir, inside=False)
         assert is_file(join("delta-dir", "gamma-file"))
         assert not exists(gamma_dir)
@@ -302,10 +357,16 @@ def file_operations():
         epsilon_file_4 = touch(join(epsilon_dir, "epsilon-file-4"))
 
         remove("not-there")
+        remove(join(epsilon_file_1, "not-there"))
 
         remove(epsilon_file_2)
         assert not exists(epsilon_file_2)
 
+        epsilon_link = make_link("epsilon-link", epsilon_dir)
+        remove(epsilon_link)
+        assert not exists(epsilon_link)
+        assert exists(epsilon_file_1)
+
         remove(epsilon_dir)
         assert not exists(epsilon_file_1)
         assert not exists(epsilon_dir)
@@ -503,6 +564,13 @@ def io_operations():
         assert output_lines[-1] == post_lines[0], (output_lines[-1], post_lines[0])
         assert tailed_lines[0] == post_lines[0], (tailed_lines[0], post_lines[0])
 
+        long_lines = ["{}{}\n".format(i, "x" * 100) for i in range(2000)]
+        long_lines[-1] = long_lines[-1][:-1]
+        file_e = write_lines("e", long_lines)
+
+        assert tail_lines(file_e, 3) == long_lines[-3:], tail_lines(file_e, 3)
+        assert tail_lines(file_e, 0) == [], tail_lines(file_e, 0)
+
         file_c = touch("c")
         assert is_file(file_c), file_c
 
@@ -591,6 +659,31 @@ def logging_operations():
             with logging_disabled():
                 error("Yikes")
 
+    class Unformattable:
+        def __format__(self, spec):
+            raise Exception("Formatted a filtered message")
+
+    with logging_enabled(level="notice"):
+        debug("Ignore {}", Unformattable())
+
+    with temp_file() as file:
+        with logging_enabled(output=file):
+            error("Written right away")
+            warning("Also written right away")
+
+            assert "Written right away" in read(file)
+            assert "Also written right away" in read(file)
+
+    with temp_dir() as dir:
+        files = [join(dir, f"log-{i}.txt") for i in range(3)]
+
+        for file in files:
+            with logging_enabled(output=file):
+                notice("Logged to {}", file)
+
+        for file in files:
+            assert f"Logged to {file}" in read(file), read(file)
+
     with expect_output(contains="flipper") as out:
         with logging_enabled(output=out):
             with logging_context("flipper"):
@@ -722,6 +815,12 @@ def port_operations():
     result = get_random_port()
     assert result >= 49152 and result <= 65535, result
 
+    result = get_random_free_port()
+    assert result > 0, result
+
+    with expect_error():
+        check_port(result)
+
     server_port = get_random_port()
     server_socket = _socket.socket(_socket.AF_INET, _socket.SOCK_STREAM)
 
@@ -1028,6 +1127,9 @@ def test_operations():
                 with expect_error():
                     run_tests(chucker.tests, enable="skipped", unskip="*skipped*", verbose=verbose)
 
+                with expect_error():
+                    run_tests(chucker.tests, enable="skipped", unskip="skipped", verbose=verbose)
+
                 with expect_error():
                     run_tests(chucker.tests, enable="*badbye*", verbose=verbose)
 
@@ -1151,6 +1253,37 @@ def time_operations():
             with Timer(timeout=TINY_INTERVAL) as timer:
                 sleep(10)
 
+        # Nested timers share one alarm handler.  The inner timeout
+        # fires, and the outer timer keeps running.
+        prev_handler = _signal.getsignal(_signal.SIGALRM)
+
+        with Timer(timeout=10) as outer:
+            for i in range(2):
+                with expect_timeout():
+                    with Timer(timeout=TINY_INTERVAL):
+                        sleep(10)
+
+            assert outer.elapsed_time < 10, outer.elapsed_time
+
+        # The outer timeout is rearmed when an inner timer stops
+        with expect_timeout():
+            with Timer(timeout=TINY_INTERVAL * 2):
+                with Timer(timeout=10):
+                    pass
+
+                sleep(10)
+
+        assert _signal.getsignal(_signal.SIGALRM) is prev_handler
+
+        from plano.main import _timer_alarms_enabled
+
+        with _timer_alarms_enabled():
+            with expect_timeout():
+                with Timer(timeout=TINY_INTERVAL):
+                    sleep(10)
+
+        assert _signal.getsignal(_signal.SIGALRM) is prev_handler
+
 @test
 def unique_id_operations():
     id1 = get_unique_id()
@@ -1164,6 +1297,14 @@ def unique_id_operations():
     result = get_unique_id(16)
     assert len(result) == 32
 
+    result = get_unique_ids(3, 4)
+    assert len(result) == 3, result
+    assert all(len(x) == 8 for x in result), result
+    assert len(set(result)) == 3, result
+
+    result = get_unique_ids(0)
+    assert result == [], result
+
 @test
 def value_operations():
     result = nvl(None, "a")
@@ -1199,6 +1340,9 @@ def value_operations():
     result = format_repr(Namespace(a=1, b=2), limit=1)
     assert result == "Namespace(a=1)", result
 
+    result = format_repr(Namespace(a=1, b=2, c=3), limit=-1)
+    assert result == "Namespace(a=1, b=2)", result
+
     result = Namespace(a=1, b=2)
     assert result.a == 1, result
     assert result.b == 2, result
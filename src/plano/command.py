@@ -21,6 +21,7 @@ from .main import *
 
 import argparse as _argparse
 import importlib as _importlib
+import importlib.util as _importlib_util
 import inspect as _inspect
 import os as _os
 import sys as _sys
@@ -63,15 +64,19 @@ class BaseCommand:
 
                 exit(1)
 
-class BaseArgumentParser(_argparse.ArgumentParser):
+# Capitalizes the help text when the help is rendered
+class _ArgumentParser(_argparse.ArgumentParser):
+    def format_help(self):
+        _capitalize_help(self)
+        return super().format_help()
+
+class BaseArgumentParser(_ArgumentParser):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         self.allow_abbrev = False
         self.formatter_class = _argparse.RawDescriptionHelpFormatter
 
-        _capitalize_help(self)
-
 _plano_command = None
 
 class PlanoCommand(BaseCommand):
@@ -93,9 +98,9 @@ class PlanoCommand(BaseCommand):
             self.pre_parser.add_argument("-f", "--file", help="Load commands from FILE (default '.plano.py')")
             self.pre_parser.add_argument("-m", "--module", help="Load commands from MODULE")
 
-        self.parser = _argparse.ArgumentParser(parents=(self.pre_parser,),
-                                               description=description, epilog=epilog,
-                                               add_help=False, allow_abbrev=False)
+        self.parser = _ArgumentParser(parents=(self.pre_parser,),
+                                      description=description, epilog=epilog,
+                                      add_help=False, allow_abbrev=False)
 
         # This is intentionally added after self.pre_parser is passed
         # as parent to self.parser, since it is used only in the
@@ -117,7 +122,15 @@ class PlanoCommand(BaseCommand):
         if self.module is not None:
             self._bind_commands(self.module)
 
-        self._process_commands()
+        selected_command = None
+
+        if pre_args.command is not None:
+            selected_command = self.bound_commands.get(pre_args.command.split(",")[-1])
+
+        # The other commands are needed only for help and errors
+        other_commands = pre_args.help or selected_command is None
+
+        self._process_commands(selected_command, other_commands)
 
         self.preceding_commands = list()
 
@@ -162,17 +175,14 @@ class PlanoCommand(BaseCommand):
             if not self.selected_command.passthrough and self.passthrough_args:
                 self.parser.error(f"unrecognized arguments: {' '.join(self.passthrough_args)}")
 
-            for param in self.selected_command.parameters.values():
-                if param.name == "passthrough_args":
-                    continue
-
-                if param.positional:
-                    if param.multiple:
-                        self.command_args.extend(getattr(args, param.name))
+            for name, positional, multiple in self.selected_command.call_plan:
+                if positional:
+                    if multiple:
+                        self.command_args.extend(getattr(args, name))
                     else:
-                        self.command_args.append(getattr(args, param.name))
+                        self.command_args.append(getattr(args, name))
                 else:
-                    self.command_kwargs[param.name] = getattr(args, param.name)
+                    self.command_kwargs[name] = getattr(args, name)
 
             if self.selected_command.passthrough:
                 self.command_kwargs["passthrough_args"] = self.passthrough_args
@@ -212,8 +222,8 @@ class PlanoCommand(BaseCommand):
 
         _sys.path.insert(0, join(get_parent_dir(path), "python"))
 
-        spec = _importlib.util.spec_from_file_location("_plano", path)
-        module = _importlib.util.module_from_spec(spec)
+        spec = _importlib_util.spec_from_file_location("_plano", path)
+        module = _importlib_util.module_from_spec(spec)
         _sys.modules["_plano"] = module
 
         try:
@@ -237,65 +247,83 @@ class PlanoCommand(BaseCommand):
             if callable(var) and var.__class__.__name__ == "Command":
                 self.bound_commands[var.name] = var
 
-    def _process_commands(self):
+    # Only the selected command gets a complete subparser
+    def _process_commands(self, selected_command=None, other_commands=True):
         subparsers = self.parser.add_subparsers(title="commands", dest="command", metavar="{command}")
 
+        if not other_commands:
+            # No help will be shown
+            self._add_command_subparser(subparsers, selected_command, describe=False)
+            return
+
         for command in self.bound_commands.values():
-            # This doesn't work yet, but in the future it might.
-            # https://bugs.python.org/issue22848
-            #
-            # help = _argparse.SUPPRESS if command.hidden else command.help
+            if command is selected_command:
+                self._add_command_subparser(subparsers, command)
+            else:
+                subparsers.add_parser(command.name, help=_get_command_help(command), add_help=False)
 
-            help = "[internal]" if command.hidden else command.help
-            add_help = False if command.passthrough else True
-            description = nvl(command.description, command.help)
+    def _add_command_subparser(self, subparsers, command, describe=True):
+        add_help = False if command.passthrough else True
 
-            subparser = subparsers.add_parser(command.name, help=help, add_help=add_help, description=description,
+        if describe:
+            subparser = subparsers.add_parser(command.name, help=_get_command_help(command), add_help=add_help,
+                                              description=command.description,
                                               formatter_class=_argparse.RawDescriptionHelpFormatter)
+        else:
+            subparser = subparsers.add_parser(command.name, add_help=add_help)
 
-            if not command.passthrough:
-                subparser.add_argument("--verbose", action="store_true",
-                                       help="Print detailed logging to the console")
-                subparser.add_argument("--quiet", action="store_true",
-                                       help="Print no logging to the console")
+        if not command.passthrough:
+            subparser.add_argument("--verbose", action="store_true",
+                                   help="Print detailed logging to the console")
+            subparser.add_argument("--quiet", action="store_true",
+                                   help="Print no logging to the console")
 
-            for param in command.parameters.values():
-                if not command.passthrough and param.name in ("verbose", "quiet"):
-                    continue
+        for param in command.parameters.values():
+            if not command.passthrough and param.name in ("verbose", "quiet"):
+                continue
 
-                if param.positional:
-                    if param.multiple:
-                        subparser.add_argument(param.name, metavar=param.metavar, type=param.type, help=param.help,
-                                               nargs="*")
-                    elif param.optional:
-                        subparser.add_argument(param.name, metavar=param.metavar, type=param.type, help=param.help,
-                                               nargs="?", default=param.default)
-                    else:
-                        subparser.add_argument(param.name, metavar=param.metavar, type=param.type, help=param.help)
-                else:
-                    flag_args = list()
+            subparser.add_argument(*param.argument_args, **param.argument_kwargs)
 
-                    if param.short_option is not None:
-                        flag_args.append("-{}".format(param.short_option))
+def _get_argument_spec(param):
+    if param.positional:
+        args = (param.name,)
+        kwargs = dict(metavar=param.metavar, type=param.type, help=param.help)
 
-                    flag_args.append("--{}".format(param.display_name))
+        if param.multiple:
+            kwargs["nargs"] = "*"
+        elif param.optional:
+            kwargs["nargs"] = "?"
+            kwargs["default"] = param.default
 
-                    help = param.help
+        return args, kwargs
 
-                    if param.default not in (None, False):
-                        if help is None:
-                            help = "Default value is {}".format(repr(param.default))
-                        else:
-                            help += " (default {})".format(repr(param.default))
+    args = (f"--{param.display_name}",)
 
-                    if param.default is False:
-                        subparser.add_argument(*flag_args, dest=param.name, default=param.default, action="store_true",
-                                               help=help)
-                    else:
-                        subparser.add_argument(*flag_args, dest=param.name, default=param.default,
-                                               metavar=param.metavar, type=param.type, help=help)
+    if param.short_option is not None:
+        args = (f"-{param.short_option}",) + args
+
+    help = param.help
+
+    if param.default not in (None, False):
+        if param.help is None:
+            help = f"Default value is {param.default!r}"
+        else:
+            help = f"{param.help} (default {param.default!r})"
+
+    if param.default is False:
+        kwargs = dict(dest=param.name, default=param.default, action="store_true", help=help)
+    else:
+        kwargs = dict(dest=param.name, default=param.default, metavar=param.metavar, type=param.type, help=help)
+
+    return args, kwargs
 
-            _capitalize_help(subparser)
+def _get_command_help(command):
+    # This doesn't work yet, but in the future it might.
+    # https://bugs.python.org/issue22848
+    #
+    # return _argparse.SUPPRESS if command.hidden else command.help
+
+    return "[internal]" if command.hidden else command.help
 
 _command_help = {
     "build":    "Build artifacts from source",
@@ -323,6 +351,10 @@ def command(_function=None, name=None, parameters=None, parent=None, passthrough
                 self.name = nvl(self.name, default)
                 self.parameters = self._process_parameters(parameters)
                 self.passthrough = passthrough
+
+                # The arguments for adding each parameter to a parser
+                for param in self.parameters.values():
+                    param.argument_args, param.argument_kwargs = _get_argument_spec(param)
             else:
                 assert parameters is None
 
@@ -345,10 +377,18 @@ def command(_function=None, name=None, parameters=None, parent=None, passthrough
 
             self.hidden = hidden
 
+            # How parsed arguments map onto a call of the function
+            self.call_plan = tuple((x.name, x.positional, x.multiple) for x in self.parameters.values()
+                                   if x.name != "passthrough_args")
+
+            # Positional parameters, in order, and keyword parameters
+            self.positional_parameters = tuple(x for x in self.parameters.values() if x.positional)
+            self.keyword_parameters = tuple(x for x in self.parameters.values() if not x.positional)
+
             debug("Defining {}", self)
 
             for param in self.parameters.values():
-                debug("  {}", str(param).capitalize())
+                debug("  {}", param)
 
         def __repr__(self):
             return "command '{}:{}'".format(self.module.__name__, self.name)
@@ -367,31 +407,33 @@ def command(_function=None, name=None, parameters=None, parent=None, passthrough
                 return cparams_in
 
             for sparam in sparams:
-                try:
-                    cparam = cparams_in[sparam.name]
-                except KeyError:
+                cparam = cparams_in.get(sparam.name)
+
+                if cparam is None:
                     cparam = CommandParameter(sparam.name)
 
-                if sparam.kind is sparam.POSITIONAL_ONLY: # pragma: nocover
-                    if sparam.positional is None:
+                kind = sparam.kind
+
+                if kind is sparam.POSITIONAL_ONLY: # pragma: nocover
+                    if cparam.positional is None:
                         cparam.positional = True
-                elif sparam.kind is sparam.POSITIONAL_OR_KEYWORD and sparam.default is sparam.empty:
+                elif kind is sparam.POSITIONAL_OR_KEYWORD and sparam.default is sparam.empty:
                     if cparam.positional is None:
                         cparam.positional = True
-                elif sparam.kind is sparam.POSITIONAL_OR_KEYWORD and sparam.default is not sparam.empty:
+                elif kind is sparam.POSITIONAL_OR_KEYWORD:
                     cparam.optional = True
                     cparam.default = sparam.default
-                elif sparam.kind is sparam.VAR_POSITIONAL:
+                elif kind is sparam.VAR_POSITIONAL:
                     if cparam.positional is None:
                         cparam.positional = True
                     cparam.multiple = True
-                elif sparam.kind is sparam.VAR_KEYWORD:
+                elif kind is sparam.VAR_KEYWORD:
                     continue
-                elif sparam.kind is sparam.KEYWORD_ONLY:
+                elif kind is sparam.KEYWORD_ONLY:
                     cparam.optional = True
                     cparam.default = sparam.default
                 else: # pragma: nocover
-                    raise NotImplementedError(sparam.kind)
+                    raise NotImplementedError(kind)
 
                 if cparam.type is None and cparam.default not in (None, False): # XXX why false?
                     cparam.type = type(cparam.default)
@@ -401,7 +443,6 @@ def command(_function=None, name=None, parameters=None, parent=None, passthrough
             return cparams_out
 
         def __call__(self, *args, **kwargs):
-            from .command import _plano_command, PlanoCommand
             assert isinstance(_plano_command, PlanoCommand), _plano_command
 
             app = _plano_command
@@ -416,7 +457,7 @@ def command(_function=None, name=None, parameters=None, parent=None, passthrough
 
                 return
 
-            debug("Running {} {} {}".format(self, args, kwargs))
+            debug("Running {} {} {}", self, args, kwargs)
 
             app.running_commands.append(self)
 
@@ -425,47 +466,47 @@ def command(_function=None, name=None, parameters=None, parent=None, passthrough
                 display_args = list(self._get_display_args(args, kwargs))
 
                 with console_color("magenta", file=_sys.stderr):
-                    eprint("{}--> {}".format(dashes, self.name), end="")
+                    eprint(f"{dashes}--> {self.name}", end="")
 
                     if display_args:
-                        eprint(" ({})".format(", ".join(display_args)), end="")
+                        eprint(f" ({', '.join(display_args)})", end="")
 
                     eprint()
 
             self.function(*args, **kwargs)
 
             if not app.quiet:
-                cprint("{}<-- {}".format(dashes, self.name), color="magenta", file=_sys.stderr)
+                cprint(f"{dashes}<-- {self.name}", color="magenta", file=_sys.stderr)
 
             app.running_commands.pop()
 
         def _get_display_args(self, args, kwargs):
-            for i, param in enumerate(self.parameters.values()):
-                if param.positional:
-                    if param.multiple:
-                        for va in args[i:]:
-                            yield repr(va)
-                    elif param.optional:
-                        value = args[i]
-
-                        if value == param.default:
-                            continue
-
-                        yield repr(value)
-                    else:
-                        yield repr(args[i])
-                else:
-                    value = kwargs.get(param.name, param.default)
+            for i, param in enumerate(self.positional_parameters):
+                if param.multiple:
+                    for va in args[i:]:
+                        yield repr(va)
+                elif param.optional:
+                    value = args[i]
 
                     if value == param.default:
                         continue
 
-                    if value in (True, False):
-                        value = str(value).lower()
-                    else:
-                        value = repr(value)
+                    yield repr(value)
+                else:
+                    yield repr(args[i])
+
+            for param in self.keyword_parameters:
+                value = kwargs.get(param.name, param.default)
+
+                if value == param.default:
+                    continue
+
+                if value in (True, False):
+                    value = str(value).lower()
+                else:
+                    value = repr(value)
 
-                    yield "{}={}".format(param.display_name, value)
+                yield f"{param.display_name}={value}"
 
     if _function is None:
         return Command
@@ -474,7 +515,8 @@ def command(_function=None, name=None, parameters=None, parent=None, passthrough
 
 def parent(*args, **kwargs):
     try:
-        f_locals = _inspect.stack()[2].frame.f_locals
+        # The caller's caller is the running Command.__call__
+        f_locals = _inspect.currentframe().f_back.f_back.f_locals
         parent_fn = f_locals["self"].parent.function
     except:
         fail("Missing parent command")
@@ -482,6 +524,9 @@ def parent(*args, **kwargs):
     parent_fn(*args, **kwargs)
 
 class CommandParameter:
+    __slots__ = ("name", "display_name", "type", "metavar", "help", "short_option", "default", "positional",
+                 "optional", "multiple", "argument_args", "argument_kwargs")
+
     def __init__(self, name, display_name=None, type=None, metavar=None, help=None, short_option=None, default=None, positional=None):
         self.name = name
         self.display_name = nvl(display_name, self.name.replace("_", "-"))
@@ -495,6 +540,9 @@ class CommandParameter:
         self.optional = False
         self.multiple = False
 
+        self.argument_args = None
+        self.argument_kwargs = None
+
     def __repr__(self):
         return "parameter '{}' (default {})".format(self.name, repr(self.default))
 
@@ -18,15 +18,14 @@
 #
 
 import base64 as _base64
-import binascii as _binascii
-import code as _code
 import datetime as _datetime
 import fnmatch as _fnmatch
+import functools as _functools
 import getpass as _getpass
+import io as _io
+import itertools as _itertools
 import json as _json
 import os as _os
-import pprint as _pprint
-import pkgutil as _pkgutil
 import random as _random
 import re as _re
 import shlex as _shlex
@@ -40,7 +39,7 @@ import time as _time
 import traceback as _traceback
 import urllib as _urllib
 import urllib.parse as _urllib_parse
-import uuid as _uuid
+import weakref as _weakref
 
 _max = max
 
@@ -87,8 +86,14 @@ def make_archive(input_dir, output_file=None, quiet=False):
 
     _notice(quiet, "Making archive {} from directory {}", repr(output_file), repr(input_dir))
 
+    # pigz compresses on all cores
+    if which("pigz") is not None:
+        command = ["tar", "--use-compress-program=pigz", "-cf", output_file, archive_stem]
+    else:
+        command = ["tar", "-czf", output_file, archive_stem]
+
     with working_dir(get_parent_dir(input_dir), quiet=True):
-        run(f"tar -czf {output_file} {archive_stem}", quiet=True)
+        run(command, quiet=True)
 
     return output_file
 
@@ -106,7 +111,7 @@ def extract_archive(input_file, output_dir=None, quiet=False):
     input_file = input_file.replace("\\", "/")
 
     with working_dir(output_dir, quiet=True):
-        run(f"tar -xf {input_file}", quiet=True)
+        run(["tar", "-xf", input_file], quiet=True)
 
     return output_dir
 
@@ -158,20 +163,36 @@ _color_codes = {
     "gray": "\u001b[90",
 }
 
+# Complete escape sequences by (color, bright)
+_color_sequences = {(color, bright): "{}{}m".format(code, ";1" if bright else "")
+                    for color, code in _color_codes.items() for bright in (False, True)}
+
 _color_reset = "\u001b[0m"
 
+# Whether each file is a terminal
+_color_enabled_files = _weakref.WeakKeyDictionary()
+
 def _get_color_code(color, bright):
-    elems = [_color_codes[color]]
+    return _color_sequences[(color, bool(bright))]
+
+def _is_color_enabled(file):
+    if PLANO_COLOR:
+        return True
 
-    if bright:
-        elems.append(";1")
+    try:
+        return _color_enabled_files[file]
+    except (KeyError, TypeError):
+        pass
 
-    elems.append("m")
+    enabled = hasattr(file, "isatty") and file.isatty()
 
-    return "".join(elems)
+    try:
+        _color_enabled_files[file] = enabled
+    except TypeError: # pragma: nocover
+        # The file doesn't support weak references
+        pass
 
-def _is_color_enabled(file):
-    return PLANO_COLOR or hasattr(file, "isatty") and file.isatty()
+    return enabled
 
 class console_color:
     def __init__(self, color=None, bright=False, file=_sys.stdout):
@@ -234,6 +255,8 @@ except NameError: # pragma: nocover
         pdb.set_trace()
 
 def repl(locals): # pragma: nocover
+    import code as _code
+
     _code.InteractiveConsole(locals=locals).interact()
 
 def print_properties(props, file=None):
@@ -265,28 +288,33 @@ def find(dirs=None, include="*", exclude=[]):
     if is_string(exclude):
         exclude = [exclude]
 
-    found = set()
+    include = _compile_patterns(tuple(include))
+    exclude = _compile_patterns(tuple(exclude))
+    found = list()
 
     for dir in dirs:
         for root, dir_names, file_names in _os.walk(dir, followlinks=True):
-            names = dir_names + file_names
+            root = root.removeprefix("./")
 
-            for include_pattern in include:
-                names = _fnmatch.filter(names, include_pattern)
+            if root == ".":
+                root = ""
 
-                for exclude_pattern in exclude:
-                    for name in _fnmatch.filter(names, exclude_pattern):
-                        names.remove(name)
+            found.extend(join(root, x) for x in _itertools.chain(dir_names, file_names)
+                         if include.match(x) and not exclude.match(x))
 
-                root = root.removeprefix("./")
-
-                if root == ".":
-                    root = ""
-
-                found.update([join(root, x) for x in names])
+    # Only overlapping roots can produce duplicates
+    if len(dirs) > 1:
+        found = unique(found)
 
     return sorted(found)
 
+# Compile glob patterns into one regex that matches any of them.  An
+# empty list of patterns matches nothing.
+@_functools.lru_cache(maxsize=256)
+def _compile_patterns(patterns):
+    regex = "|".join(_fnmatch.translate(x) for x in patterns) or "(?!)"
+    return _re.compile(regex, _re.IGNORECASE if WINDOWS else 0)
+
 def make_dir(dir, quiet=False):
     if dir == "":
         return dir
@@ -327,16 +355,10 @@ def list_dir(dir=None, include="*", exclude=[]):
     if is_string(exclude):
         exclude = [exclude]
 
-    names = _os.listdir(dir)
-
-    for include_pattern in include:
-        names = _fnmatch.filter(names, include_pattern)
-
-        for exclude_pattern in exclude:
-            for name in _fnmatch.filter(names, exclude_pattern):
-                names.remove(name)
+    include = _compile_patterns(tuple(include))
+    exclude = _compile_patterns(tuple(exclude))
 
-    return sorted(names)
+    return sorted(x for x in _os.listdir(dir) if include.match(x) and not exclude.match(x))
 
 def print_dir(dir=None, include="*", exclude=[]):
     if dir is None:
@@ -408,18 +430,43 @@ def get_user():
 def get_hostname():
     return _socket.gethostname()
 
+# The program name for the last seen process arguments
+_program_name_args = None
+_program_name = None
+
 def get_program_name(command=None):
+    global _program_name_args, _program_name
+
     if command is None:
-        args = ARGS
-    else:
-        args = command.split()
+        if ARGS != _program_name_args:
+            _program_name_args = list(ARGS)
+            _program_name = _get_program_name(ARGS)
+
+        return _program_name
+
+    return _get_program_name(command.split())
 
+def _get_program_name(args):
     for arg in args:
         if "=" not in arg:
             return get_base_name(arg)
 
+# Programs found on the PATH, by name and PATH value
+_which_cache = dict()
+
 def which(program_name):
-    return _shutil.which(program_name)
+    key = program_name, _os.environ.get("PATH")
+    path = _which_cache.get(key)
+
+    if path is not None and _os.access(path, _os.X_OK):
+        return path
+
+    path = _shutil.which(program_name)
+
+    if path is not None and _os.path.isabs(path):
+        _which_cache[key] = path
+
+    return path
 
 def check_env(var, message=None):
     if var not in _os.environ:
@@ -429,6 +476,8 @@ def check_env(var, message=None):
         raise PlanoError(message)
 
 def check_module(module, message=None):
+    import pkgutil as _pkgutil
+
     if _pkgutil.find_loader(module) is None:
         if message is None:
             message = "Python module {} is not found".format(repr(module))
@@ -518,7 +567,14 @@ def touch(file, quiet=False):
     try:
         _os.utime(file, None)
     except OSError:
-        append(file, "")
+        # The parent directory is made only if it is missing
+        try:
+            fd = _os.open(file, _os.O_WRONLY | _os.O_CREAT, 0o666)
+        except FileNotFoundError:
+            make_parent_dir(file, quiet=True)
+            fd = _os.open(file, _os.O_WRONLY | _os.O_CREAT, 0o666)
+
+        _os.close(fd)
 
     return file
 
@@ -535,18 +591,27 @@ def copy(from_path, to_path, symlinks=True, inside=True, quiet=False):
     else:
         make_parent_dir(to_path, quiet=True)
 
-    if is_link(from_path) and symlinks:
+    _copy_path(from_path, to_path, symlinks, is_link(from_path), is_dir(from_path))
+
+    return to_path
+
+def _copy_path(from_path, to_path, symlinks, link, dir):
+    if link and symlinks:
         make_link(to_path, read_link(from_path), quiet=True)
-    elif is_dir(from_path):
-        for name in list_dir(from_path):
-            copy(join(from_path, name), join(to_path, name), symlinks=symlinks, inside=False, quiet=True)
+    elif dir:
+        # List the entries before to_path is made, in case it is inside from_path
+        with _os.scandir(from_path) as entries:
+            entries = list(entries)
+
+        make_dir(to_path, quiet=True)
+
+        for entry in entries:
+            _copy_path(entry.path, join(to_path, entry.name), symlinks, entry.is_symlink(), entry.is_dir())
 
         _shutil.copystat(from_path, to_path)
     else:
         _shutil.copy2(from_path, to_path)
 
-    return to_path
-
 # inside=True - Place from_path inside to_path if to_path is a directory
 def move(from_path, to_path, inside=True, quiet=False):
     from_path = expand(from_path)
@@ -554,7 +619,20 @@ def move(from_path, to_path, inside=True, quiet=False):
 
     _notice(quiet, "Moving {} to {}", repr(from_path), repr(to_path))
 
-    to_path = copy(from_path, to_path, inside=inside, quiet=True)
+    if is_dir(to_path) and inside:
+        to_path = join(to_path, get_base_name(from_path))
+
+    # Rename if possible.  Otherwise, copy and then remove.
+    if not _os.path.lexists(to_path):
+        make_parent_dir(to_path, quiet=True)
+
+        try:
+            _os.rename(from_path, to_path)
+            return to_path
+        except OSError:
+            pass
+
+    to_path = copy(from_path, to_path, inside=False, quiet=True)
     remove(from_path, quiet=True)
 
     return to_path
@@ -596,15 +674,18 @@ def remove(paths, quiet=False):
     for path in paths:
         path = expand(path)
 
-        if not exists(path):
+        # A missing path fails with not found or not a directory
+        try:
+            _os.remove(path)
+        except (FileNotFoundError, NotADirectoryError):
             continue
+        except OSError:
+            if _os.path.islink(path) or not _os.path.isdir(path):
+                raise
 
-        _debug(quiet, "Removing {}", repr(path))
-
-        if is_dir(path):
             _shutil.rmtree(path, ignore_errors=True)
-        else:
-            _os.remove(path)
+
+        _debug(quiet, "Removed {}", repr(path))
 
 def get_file_size(file):
     file = expand(file)
@@ -691,7 +772,30 @@ def prepend_lines(file, lines):
 def tail_lines(file, count):
     assert count >= 0, count
 
-    lines = read_lines(file)
+    if count == 0:
+        return []
+
+    file = expand(file)
+
+    with open(file, "rb") as f:
+        # Read backward until the tail holds enough lines
+        start = f.seek(0, _os.SEEK_END)
+        newlines = 0
+
+        while start > 0 and newlines <= count:
+            size = min(start, 65536)
+            start -= size
+
+            f.seek(start)
+            newlines += f.read(size).count(b"\n")
+
+        f.seek(start)
+
+        if start > 0:
+            # Skip the partial line at the start of the tail
+            f.readline()
+
+        lines = _io.TextIOWrapper(f).readlines()
 
     return lines[-count:]
 
@@ -725,20 +829,14 @@ def skip(iterable, values=(None, "", (), [], {})):
     if is_scalar(values):
         values = [values]
 
-    items = list()
-
-    for item in iterable:
-        if item not in values:
-            items.append(item)
-
-    return items
+    return [x for x in iterable if x not in values]
 
 ## JSON operations
 
 def read_json(file):
     file = expand(file)
 
-    with open(file) as f:
+    with open(file, "rb") as f:
         return _json.load(f)
 
 def write_json(file, data):
@@ -747,7 +845,7 @@ def write_json(file, data):
     make_parent_dir(file, quiet=True)
 
     with open(file, "w") as f:
-        _json.dump(data, f, indent=4, separators=(",", ": "), sort_keys=True)
+        f.write(emit_json(data))
 
     return file
 
@@ -783,7 +881,7 @@ def _run_curl(method, url, content=None, content_file=None, content_type=None, o
         args.extend(["-H", "Expect:", "-d", f"@{content_file}"])
 
     if content_type is not None:
-        args.extend(["-H", f"'Content-Type: {content_type}'"])
+        args.extend(["-H", f"Content-Type: {content_type}"])
 
     if output_file is not None:
         args.extend(["-o", output_file])
@@ -912,23 +1010,47 @@ _logging_output = None
 _logging_threshold = _NOTICE
 _logging_contexts = list()
 
+# The file opened for an output path, if any
+_logging_file = None
+_logging_file_atexit_registered = False
+
 def enable_logging(level="notice", output=None, quiet=False):
     assert level in _logging_levels, level
 
     _notice(quiet, "Enabling logging (level={}, output={})", repr(level), repr(nvl(output, "stderr")))
 
+    global _logging_file, _logging_file_atexit_registered
+
+    if _logging_file is not None and _logging_file is not output:
+        _logging_file.close()
+        _logging_file = None
+
+    _flush_logging_file()
+
     global _logging_threshold
     _logging_threshold = _logging_levels.index(level)
 
     if is_string(output):
-        output = open(output, "w")
+        output = open(output, "w", buffering=65536)
+        _logging_file = output
+
+        if not _logging_file_atexit_registered:
+            import atexit as _atexit
+            _atexit.register(_flush_logging_file)
+            _logging_file_atexit_registered = True
 
     global _logging_output
     _logging_output = output
 
+def _flush_logging_file():
+    if _logging_file is not None and not _logging_file.closed:
+        _logging_file.flush()
+
 def disable_logging(quiet=False):
     _notice(quiet, "Disabling logging")
 
+    _flush_logging_file()
+
     global _logging_threshold
     _logging_threshold = _DISABLED
 
@@ -938,19 +1060,26 @@ class logging_enabled:
         self.output = output
 
     def __enter__(self):
+        global _logging_file
+
         self.prev_level = _logging_levels[_logging_threshold]
         self.prev_output = _logging_output
 
+        _flush_logging_file()
+        self.prev_file, _logging_file = _logging_file, None
+
         if self.level == "disabled":
             disable_logging(quiet=True)
         else:
             enable_logging(level=self.level, output=self.output, quiet=True)
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if self.prev_level == "disabled":
-            disable_logging(quiet=True)
-        else:
-            enable_logging(level=self.prev_level, output=self.prev_output, quiet=True)
+        global _logging_file
+
+        enable_logging(level=self.prev_level, output=self.prev_output, quiet=True)
+
+        if self.prev_file is not None:
+            _logging_file = self.prev_file
 
 class logging_disabled(logging_enabled):
     def __init__(self):
@@ -979,16 +1108,20 @@ def fail(message, *args):
     raise PlanoError(message)
 
 def error(message, *args):
-    log(_ERROR, message, *args)
+    if _logging_threshold <= _ERROR:
+        _print_message(_ERROR, message, args)
 
 def warning(message, *args):
-    log(_WARNING, message, *args)
+    if _logging_threshold <= _WARNING:
+        _print_message(_WARNING, message, args)
 
 def notice(message, *args):
-    log(_NOTICE, message, *args)
+    if _logging_threshold <= _NOTICE:
+        _print_message(_NOTICE, message, args)
 
 def debug(message, *args):
-    log(_DEBUG, message, *args)
+    if _logging_threshold <= _DEBUG:
+        _print_message(_DEBUG, message, args)
 
 def log(level, message, *args):
     if is_string(level):
@@ -997,29 +1130,33 @@ def log(level, message, *args):
     if _logging_threshold <= level:
         _print_message(level, message, args)
 
-def _print_message(level, message, args):
-    line = list()
-    out = nvl(_logging_output, _sys.stderr)
-
-    program_text = "{}:".format(get_program_name())
+# The color and brightness for each level
+_logging_level_colors = {
+    "debug": ("white", False),
+    "notice": ("cyan", False),
+    "warning": ("yellow", False),
+    "error": ("red", True),
+    "disabled": (None, False),
+}
 
-    line.append(cformat(program_text, color="gray"))
+# The label, color, and brightness for each level, by index
+_logging_level_styles = tuple((f"{name}:", *_logging_level_colors[name]) for name in _logging_levels)
 
-    level_text = "{}:".format(_logging_levels[level])
-    level_color = ("white", "cyan", "yellow", "red", None)[level]
-    level_bright = (False, False, False, True, False)[level]
+def _print_message(level, message, args):
+    out = nvl(_logging_output, _sys.stderr)
+    label, color, bright = _logging_level_styles[level]
 
-    line.append(cformat(level_text, color=level_color, bright=level_bright))
+    line = [cformat(f"{get_program_name()}:", color="gray"), cformat(label, color=color, bright=bright)]
 
     for name in _logging_contexts:
-        line.append(cformat("{}:".format(name), color="yellow"))
+        line.append(cformat(f"{name}:", color="yellow"))
 
     if isinstance(message, BaseException):
         exception = message
 
         line.append(str(exception))
 
-        print(" ".join(line), file=out)
+        out.write(" ".join(line) + "\n")
 
         if hasattr(exception, "__traceback__"):
             _traceback.print_exception(type(exception), exception, exception.__traceback__, file=out)
@@ -1031,19 +1168,20 @@ def _print_message(level, message, args):
 
         line.append(capitalize(message))
 
-        print(" ".join(line), file=out)
+        out.write(" ".join(line) + "\n")
 
-    out.flush()
+    if level >= _WARNING or out is not _logging_file:
+        out.flush()
 
 def _notice(quiet, message, *args):
-    if quiet:
-        debug(message, *args)
-    else:
-        notice(message, *args)
+    level = _DEBUG if quiet else _NOTICE
+
+    if _logging_threshold <= level:
+        _print_message(level, message, args)
 
 def _debug(quiet, message, *args):
-    if not quiet:
-        debug(message, *args)
+    if not quiet and _logging_threshold <= _DEBUG:
+        _print_message(_DEBUG, message, args)
 
 ## Path operations
 
@@ -1101,51 +1239,35 @@ def join(*paths):
 
     return path
 
+# These expand and normalize the path once, in normalize_path
+
 def split(path):
-    path = expand(path)
     path = normalize_path(path)
-    parent, child = _os.path.split(path)
-
-    return parent, child
+    return _os.path.split(path)
 
 def split_extension(path):
-    path = expand(path)
     path = normalize_path(path)
-    root, ext = _os.path.splitext(path)
-
-    return root, ext
+    return _os.path.splitext(path)
 
 def get_parent_dir(path):
-    path = expand(path)
     path = normalize_path(path)
-    parent, child = split(path)
-
-    return parent
+    return _os.path.dirname(path)
 
 def get_base_name(path):
-    path = expand(path)
     path = normalize_path(path)
-    parent, name = split(path)
-
-    return name
+    return _os.path.basename(path)
 
 def get_name_stem(file):
-    file = expand(file)
     name = get_base_name(file)
 
     if name.endswith(".tar.gz"):
         name = name[:-3]
 
-    stem, ext = split_extension(name)
-
-    return stem
+    return _os.path.splitext(name)[0]
 
 def get_name_extension(file):
-    file = expand(file)
     name = get_base_name(file)
-    stem, ext = split_extension(name)
-
-    return ext
+    return _os.path.splitext(name)[1]
 
 def _check_path(path, test_func, message):
     path = expand(path)
@@ -1204,11 +1326,18 @@ def get_random_port(min=49152, max=65535):
 
     raise PlanoError("Random ports unavailable")
 
-def check_port(port, host="localhost"):
-    sock = _socket.socket(_socket.AF_INET, _socket.SOCK_STREAM)
-    sock.setsockopt(_socket.SOL_SOCKET, _socket.SO_REUSEADDR, 1)
+# The port may be taken by another process before the caller binds it
+def get_random_free_port(host="localhost"):
+    with _socket.socket(_socket.AF_INET, _socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
 
-    if sock.connect_ex((host, port)) != 0:
+def _is_port_open(port, host):
+    with _socket.socket(_socket.AF_INET, _socket.SOCK_STREAM) as sock:
+        return sock.connect_ex((host, port)) == 0
+
+def check_port(port, host="localhost"):
+    if not _is_port_open(port, host):
         raise PlanoError("Port {} (host {}) is not reachable".format(repr(port), repr(host)))
 
 def await_port(port, host="localhost", timeout=30, quiet=False):
@@ -1221,14 +1350,9 @@ def await_port(port, host="localhost", timeout=30, quiet=False):
     period = 0.03125
 
     with Timer(timeout=timeout, timeout_message=timeout_message) as timer:
-        while True:
-            try:
-                check_port(port, host=host)
-            except PlanoError:
-                sleep(period, quiet=True)
-                period = min(1, period * 2)
-            else:
-                return
+        while not _is_port_open(port, host):
+            sleep(period, quiet=True)
+            period = min(0.25, period * 2)
 
 ## Process operations
 
@@ -1249,6 +1373,14 @@ def _format_command(command, represent=True):
     else:
         return command
 
+# Formats a command only when a log message that includes it is printed
+class _FormattedCommand:
+    def __init__(self, command):
+        self.command = command
+
+    def __str__(self):
+        return _format_command(self.command)
+
 # quiet=False - Don't log at notice level
 # stash=False - No output unless there is an error
 # output=<file> - Send stdout and stderr to a file
@@ -1257,7 +1389,7 @@ def _format_command(command, represent=True):
 # stderr=<file> - Send stderr to a file
 # shell=False - XXX
 def start(command, stdin=None, stdout=None, stderr=None, output=None, shell=False, stash=False, quiet=False):
-    _notice(quiet, "Starting a new process (command {})", _format_command(command))
+    _notice(quiet, "Starting a new process (command {})", _FormattedCommand(command))
 
     if output is not None:
         stdout, stderr = output, output
@@ -1356,7 +1488,10 @@ def wait(proc, timeout=None, check=False, quiet=False):
 
     if proc.stash_file is not None:
         if proc.exit_code > 0:
-            eprint(read(proc.stash_file), end="")
+            with open(proc.stash_file, "rb") as f:
+                data = f.read()
+
+            _sys.stderr.write(data.decode("utf-8", errors="replace"))
 
         if not WINDOWS:
             remove(proc.stash_file, quiet=True)
@@ -1369,7 +1504,7 @@ def wait(proc, timeout=None, check=False, quiet=False):
 # input=<string> - Pipe <string> to the process
 def run(command, stdin=None, stdout=None, stderr=None, input=None, output=None,
         stash=False, shell=False, check=True, quiet=False):
-    _notice(quiet, "Running command {}", _format_command(command))
+    _notice(quiet, "Running command {}", _FormattedCommand(command))
 
     if input is not None:
         assert stdin in (None, _subprocess.PIPE), stdin
@@ -1380,19 +1515,14 @@ def run(command, stdin=None, stdout=None, stderr=None, input=None, output=None,
     proc = start(command, stdin=stdin, stdout=stdout, stderr=stderr, output=output,
                  stash=stash, shell=shell, quiet=True)
 
+    # PlanoProcess decodes the results on first access
     proc.stdout_result, proc.stderr_result = proc.communicate(input=input)
 
-    if proc.stdout_result is not None:
-        proc.stdout_result = proc.stdout_result.decode("utf-8")
-
-    if proc.stderr_result is not None:
-        proc.stderr_result = proc.stderr_result.decode("utf-8")
-
     return wait(proc, check=check, quiet=True)
 
 # input=<string> - Pipe the given input into the process
 def call(command, input=None, shell=False, quiet=False):
-    _notice(quiet, "Calling {}", _format_command(command))
+    _notice(quiet, "Calling {}", _FormattedCommand(command))
 
     proc = run(command, stdin=_subprocess.PIPE, stdout=_subprocess.PIPE, stderr=_subprocess.PIPE,
                input=input, shell=shell, check=True, quiet=True)
@@ -1440,12 +1570,38 @@ class PlanoProcess(_subprocess.Popen):
         self.stdout_result = None
         self.stderr_result = None
 
+        # Forget processes that have already been reaped
+        _child_processes[:] = [x for x in _child_processes if x.returncode is None]
         _child_processes.append(self)
 
     @property
     def exit_code(self):
         return self.returncode
 
+    # Captured output is decoded only if someone asks for it
+
+    @property
+    def stdout_result(self):
+        if isinstance(self._stdout_result, bytes):
+            self._stdout_result = self._stdout_result.decode("utf-8")
+
+        return self._stdout_result
+
+    @stdout_result.setter
+    def stdout_result(self, value):
+        self._stdout_result = value
+
+    @property
+    def stderr_result(self):
+        if isinstance(self._stderr_result, bytes):
+            self._stderr_result = self._stderr_result.decode("utf-8")
+
+        return self._stderr_result
+
+    @stderr_result.setter
+    def stderr_result(self, value):
+        self._stderr_result = value
+
     def __enter__(self):
         return self
 
@@ -1461,20 +1617,26 @@ class PlanoProcessError(_subprocess.CalledProcessError, PlanoError):
 
 def _default_sigterm_handler(signum, frame):
     for proc in _child_processes:
-        if proc.poll() is None:
+        if proc.returncode is None and proc.poll() is None:
             kill(proc, quiet=True)
 
+    _flush_logging_file()
+
     exit(-(_signal.SIGTERM))
 
 _signal.signal(_signal.SIGTERM, _default_sigterm_handler)
 
 ## String operations
 
+@_functools.lru_cache(maxsize=1024)
+def _compile_re(pattern):
+    return _re.compile(pattern)
+
 def string_replace_re(string, pattern, replacement, count=0):
-    return _re.sub(pattern, replacement, string, count)
+    return _compile_re(pattern).sub(replacement, string, count)
 
 def string_matches_re(string, pattern):
-    return _re.search(pattern, string) is not None
+    return _compile_re(pattern).search(string) is not None
 
 def string_matches_glob(string, pattern):
     return _fnmatch.fnmatchcase(string, pattern)
@@ -1495,6 +1657,14 @@ def shorten(string, max, ellipsis=None):
         else:
             return string[0:max]
 
+# Remembers the derived plural forms of recently used nouns
+@_functools.lru_cache(maxsize=256)
+def _plural_form(noun):
+    if noun.endswith("s"):
+        return "{}ses".format(noun)
+    else:
+        return "{}s".format(noun)
+
 def plural(noun, count=0, plural=None):
     if noun in (None, ""):
         return ""
@@ -1503,10 +1673,7 @@ def plural(noun, count=0, plural=None):
         return noun
 
     if plural is None:
-        if noun.endswith("s"):
-            plural = "{}ses".format(noun)
-        else:
-            plural = "{}s".format(noun)
+        plural = _plural_form(noun)
 
     return plural
 
@@ -1685,6 +1852,40 @@ def sleep(seconds, quiet=False):
 
     _time.sleep(seconds)
 
+_timers = list()
+_timer_prev_handler = None
+
+# Raises the timeout for the innermost running timer, or passes the
+# alarm on to the handler it replaced
+def _handle_timer_alarm(signum, frame):
+    if _timers:
+        _timers[-1].raise_timeout()
+    elif callable(_timer_prev_handler):
+        _timer_prev_handler(signum, frame)
+    elif _timer_prev_handler == _signal.SIG_DFL:
+        _signal.signal(signum, _signal.SIG_DFL)
+        _signal.raise_signal(signum)
+
+def _install_timer_alarm_handler():
+    global _timer_prev_handler
+
+    prev_handler = _signal.signal(_signal.SIGALRM, _handle_timer_alarm)
+
+    if prev_handler is not _handle_timer_alarm:
+        _timer_prev_handler = prev_handler
+
+    return prev_handler
+
+# Keeps the timer alarm handler installed across a series of timers
+class _timer_alarms_enabled:
+    def __enter__(self):
+        if hasattr(_signal, "SIGALRM"):
+            self.prev_handler = _install_timer_alarm_handler()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if hasattr(_signal, "SIGALRM"):
+            _signal.signal(_signal.SIGALRM, self.prev_handler)
+
 class Timer:
     def __init__(self, timeout=None, timeout_message=None):
         self.timeout = timeout
@@ -1700,7 +1901,13 @@ class Timer:
         self.start_time = get_time()
 
         if self.timeout is not None:
-            self.prev_handler = _signal.signal(_signal.SIGALRM, self.raise_timeout)
+            self.prev_handler = _signal.getsignal(_signal.SIGALRM)
+
+            if self.prev_handler is not _handle_timer_alarm:
+                _install_timer_alarm_handler()
+
+            _timers.append(self)
+
             self.prev_timeout, prev_interval = _signal.setitimer(_signal.ITIMER_REAL, self.timeout)
             self.prev_timer_suspend_time = get_time()
 
@@ -1712,7 +1919,11 @@ class Timer:
         if self.timeout is not None:
             assert get_time() - self.prev_timer_suspend_time > 0, "This case is not yet handled"
 
-            _signal.signal(_signal.SIGALRM, self.prev_handler)
+            _timers.remove(self)
+
+            if self.prev_handler is not _handle_timer_alarm:
+                _signal.signal(_signal.SIGALRM, self.prev_handler)
+
             _signal.setitimer(_signal.ITIMER_REAL, self.prev_timeout)
 
     def __enter__(self):
@@ -1741,10 +1952,18 @@ def get_unique_id(bytes=16):
     assert bytes >= 1
     assert bytes <= 16
 
-    uuid_bytes = _uuid.uuid4().bytes
-    uuid_bytes = uuid_bytes[:bytes]
+    return _os.urandom(bytes).hex()
+
+# Like get_unique_id(), but makes 'count' IDs at once
+def get_unique_ids(count, bytes=16):
+    assert count >= 0
+    assert bytes >= 1
+    assert bytes <= 16
+
+    digits = _os.urandom(count * bytes).hex()
+    step = bytes * 2
 
-    return _binascii.hexlify(uuid_bytes).decode("utf-8")
+    return [digits[i:i + step] for i in range(0, len(digits), step)]
 
 ## Value operations
 
@@ -1764,6 +1983,8 @@ def is_empty(value):
     return value in (None, "", (), [], {})
 
 def pformat(value):
+    import pprint as _pprint
+
     return _pprint.pformat(value, width=120)
 
 def format_empty(value, replacement):
@@ -1779,8 +2000,16 @@ def format_not_empty(value, template=None):
     return value
 
 def format_repr(obj, limit=None):
-    attrs = ["{}={}".format(k, repr(v)) for k, v in obj.__dict__.items()]
-    return "{}({})".format(obj.__class__.__name__, ", ".join(attrs[:limit]))
+    items = obj.__dict__.items()
+
+    # A negative limit drops attributes from the end, as with a slice
+    if limit is not None and limit < 0:
+        items = list(items)[:limit]
+    else:
+        items = _itertools.islice(items, limit)
+
+    attrs = ("{}={}".format(k, repr(v)) for k, v in items)
+    return "{}({})".format(obj.__class__.__name__, ", ".join(attrs))
 
 class Namespace:
     def __init__(self, **kwargs):
@@ -18,14 +18,15 @@
 #
 
 from .main import *
+from .main import _timer_alarms_enabled
 from .command import *
 
 import argparse as _argparse
-import asyncio as _asyncio
 import fnmatch as _fnmatch
 import functools as _functools
 import importlib as _importlib
 import inspect as _inspect
+import re as _re
 import sys as _sys
 import traceback as _traceback
 
@@ -130,6 +131,8 @@ def test(_function=None, name=None, module=None, timeout=None, disabled=False):
                 ret = self.function()
 
                 if _inspect.iscoroutine(ret):
+                    import asyncio as _asyncio
+
                     _asyncio.run(ret)
             except SystemExit as e:
                 error(e)
@@ -232,7 +235,12 @@ def run_tests(modules, include="*", exclude=(), enable=(), unskip=(), test_timeo
         enable = (enable,)
 
     if is_string(unskip):
-        enable = (unskip,)
+        unskip = (unskip,)
+
+    include = _compile_test_patterns(include)
+    exclude = _compile_test_patterns(exclude)
+    enable = _compile_test_patterns(enable)
+    unskip = _compile_test_patterns(unskip)
 
     test_run = TestRun(test_timeout=test_timeout, fail_fast=fail_fast, verbose=verbose, quiet=quiet)
 
@@ -252,36 +260,36 @@ def run_tests(modules, include="*", exclude=(), enable=(), unskip=(), test_timeo
 
     stop = False
 
-    for module in modules:
-        if stop:
-            break
-
-        if verbose:
-            notice("Running tests from module {} (file {})", repr(module.__name__), repr(module.__file__))
-        elif not quiet:
-            cprint("=== Module {} ===".format(repr(module.__name__)), color="cyan")
-
-        if not hasattr(module, "_plano_tests"):
-            warning("Module {} has no tests", repr(module.__name__))
-            continue
+    # One output file is shared by all the tests in the run
+    with temp_file() as output_file, _timer_alarms_enabled():
+        test_run.output_file = output_file
 
-        for test in module._plano_tests:
+        for module in modules:
             if stop:
                 break
 
-            if test.disabled and not any([_fnmatch.fnmatchcase(test.name, x) for x in enable]):
+            if verbose:
+                notice("Running tests from module {} (file {})", repr(module.__name__), repr(module.__file__))
+            elif not quiet:
+                cprint("=== Module {} ===".format(repr(module.__name__)), color="cyan")
+
+            if not hasattr(module, "_plano_tests"):
+                warning("Module {} has no tests", repr(module.__name__))
                 continue
 
-            included = any([_fnmatch.fnmatchcase(test.name, x) for x in include])
-            excluded = any([_fnmatch.fnmatchcase(test.name, x) for x in exclude])
-            unskipped = any([_fnmatch.fnmatchcase(test.name, x) for x in unskip])
+            selected = [x for x in module._plano_tests
+                        if (not x.disabled or enable.match(x.name))
+                        and include.match(x.name) and not exclude.match(x.name)]
 
-            if included and not excluded:
+            for test in selected:
                 test_run.tests.append(test)
-                stop = _run_test(test_run, test, unskipped)
+                stop = _run_test(test_run, test, unskip.match(test.name) is not None)
 
-        if not verbose and not quiet:
-            print()
+                if stop:
+                    break
+
+            if not verbose and not quiet:
+                print()
 
     total = len(test_run.tests)
     skipped = len(test_run.skipped_tests)
@@ -329,6 +337,12 @@ def run_tests(modules, include="*", exclude=(), enable=(), unskip=(), test_timeo
     if failed != 0:
         raise PlanoError(result_message)
 
+# Combines fnmatch patterns into one case-sensitive regex.  A regex
+# with no patterns matches nothing.
+def _compile_test_patterns(patterns):
+    regex = "|".join(_fnmatch.translate(x) for x in patterns) or "(?!)"
+    return _re.compile(regex)
+
 def _run_test(test_run, test, unskipped):
     if test_run.verbose:
         notice("Running {}", test)
@@ -337,52 +351,53 @@ def _run_test(test_run, test, unskipped):
 
     timeout = nvl(test.timeout, test_run.test_timeout)
 
-    with temp_file() as output_file:
-        try:
-            with Timer(timeout=timeout) as timer:
-                if test_run.verbose:
-                    test(test_run, unskipped)
-                else:
-                    with output_redirected(output_file, quiet=True):
-                        test(test_run, unskipped)
-        except KeyboardInterrupt:
-            raise
-        except PlanoTestSkipped as e:
-            test_run.skipped_tests.append(test)
-
-            if test_run.verbose:
-                notice("{} SKIPPED ({})", test, format_duration(timer.elapsed_time))
-            elif not test_run.quiet:
-                _print_test_result("SKIPPED", timer, "yellow")
-                print("Reason: {}".format(str(e)))
-        except Exception as e:
-            test_run.failed_tests.append(test)
+    output_file = test_run.output_file
 
+    try:
+        with Timer(timeout=timeout) as timer:
             if test_run.verbose:
-                _traceback.print_exc()
-
-                if isinstance(e, PlanoTimeout):
-                    error("{} **FAILED** (TIMEOUT) ({})", test, format_duration(timer.elapsed_time))
-                else:
-                    error("{} **FAILED** ({})", test, format_duration(timer.elapsed_time))
-            elif not test_run.quiet:
-                if isinstance(e, PlanoTimeout):
-                    _print_test_result("**FAILED** (TIMEOUT)", timer, color="red", bright=True)
-                else:
-                    _print_test_result("**FAILED**", timer, color="red", bright=True)
-
-                _print_test_error(e)
-                _print_test_output(output_file)
-
-            if test_run.fail_fast:
-                return True
-        else:
-            test_run.passed_tests.append(test)
+                test(test_run, unskipped)
+            else:
+                with output_redirected(output_file, quiet=True):
+                    test(test_run, unskipped)
+    except KeyboardInterrupt:
+        raise
+    except PlanoTestSkipped as e:
+        test_run.skipped_tests.append(test)
+
+        if test_run.verbose:
+            notice("{} SKIPPED ({})", test, format_duration(timer.elapsed_time))
+        elif not test_run.quiet:
+            _print_test_result("SKIPPED", timer, "yellow")
+            print("Reason: {}".format(str(e)))
+    except Exception as e:
+        test_run.failed_tests.append(test)
+
+        if test_run.verbose:
+            _traceback.print_exc()
+
+            if isinstance(e, PlanoTimeout):
+                error("{} **FAILED** (TIMEOUT) ({})", test, format_duration(timer.elapsed_time))
+            else:
+                error("{} **FAILED** ({})", test, format_duration(timer.elapsed_time))
+        elif not test_run.quiet:
+            if isinstance(e, PlanoTimeout):
+                _print_test_result("**FAILED** (TIMEOUT)", timer, color="red", bright=True)
+            else:
+                _print_test_result("**FAILED**", timer, color="red", bright=True)
+
+            _print_test_error(e)
+            _print_test_output(output_file)
+
+        if test_run.fail_fast:
+            return True
+    else:
+        test_run.passed_tests.append(test)
 
-            if test_run.verbose:
-                notice("{} PASSED ({})", test, format_duration(timer.elapsed_time))
-            elif not test_run.quiet:
-                _print_test_result("PASSED", timer)
+        if test_run.verbose:
+            notice("{} PASSED ({})", test, format_duration(timer.elapsed_time))
+        elif not test_run.quiet:
+            _print_test_result("PASSED", timer)
 
 def _print_test_result(status, timer, color="white", bright=False):
     cprint("{:<7}".format(status), color=color, bright=bright, end="")
@@ -415,6 +430,7 @@ class TestRun:
         self.fail_fast = fail_fast
         self.verbose = verbose
         self.quiet = quiet
+        self.output_file = None
 
         self.tests = list()
         self.skipped_tests = list()